@@ -1,7 +1,9 @@
 import discord
+import re
+import weatherbit
 from discord.ext import commands
 from discord.ext import menus
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 class MyMenuPages(discord.ui.View, menus.MenuPages):
     def __init__(self, source)-> None:
@@ -25,24 +27,163 @@ class MyMenuPages(discord.ui.View, menus.MenuPages):
     async def interaction_check(self, interaction:discord.Interaction)-> bool:
         return interaction.user == self.ctx.author
 
+    async def turn_page(self, interaction:discord.Interaction, page_number:int) -> None:
+        #Building a page can need a request to Weatherbit, which can take longer than Discord waits
+        # for a response, so the press is acknowledged before the page is shown.
+        await interaction.response.defer()
+        try:
+            await self.show_checked_page(page_number)
+        except weatherbit.WeatherbitError as e:
+            await send_source_error(interaction, e)
+
     #Note: Some old code uses a different order for these parameters which will cause
     # errors now. Correct order is the interaction param before the button param.
     @discord.ui.button(emoji='\U000023EA', style=discord.ButtonStyle.blurple)
     async def first_page(self, interaction:discord.Interaction, button)-> None:
-        await self.show_page(0)
-        await interaction.response.defer()
+        await self.turn_page(interaction, 0)
 
     @discord.ui.button(emoji='\U00002B05', style=discord.ButtonStyle.blurple)
     async def before_page(self, interaction:discord.Interaction, button)-> None:
-        await self.show_checked_page(self.current_page - 1)
-        await interaction.response.defer()
+        await self.turn_page(interaction, self.current_page - 1)
 
     @discord.ui.button(emoji='\U000027A1', style=discord.ButtonStyle.blurple)
     async def next_page(self, interaction:discord.Interaction, button)-> None:
-        await self.show_checked_page(self.current_page + 1)
-        await interaction.response.defer()
+        await self.turn_page(interaction, self.current_page + 1)
 
     @discord.ui.button(emoji='\U000023ED', style=discord.ButtonStyle.blurple)
     async def last_page(self, interaction:discord.Interaction, button)-> None:
-        await self.show_page(self._source.get_max_pages() - 1)
-        await interaction.response.defer()
\ No newline at end of file
+        await self.turn_page(interaction, self._source.get_max_pages() - 1)
+
+#Loaders which rebuild a page source from the key stored in a button custom id. Keyed by the
+# part of the key before the first ":".
+page_source_loaders:dict[str, Callable[[str], Awaitable[menus.PageSource]]] = {}
+
+def register_page_source(kind:str, loader:Callable[[str], Awaitable[menus.PageSource]]) -> None:
+    """
+    Registers a loader used by `PageButton` to rebuild page sources of a given kind.
+
+    Parameters
+    ----------
+    kind (str): Prefix of the keys handled by the loader.
+    loader (Callable): Coroutine function taking the full key and returning a page source.
+    """
+    page_source_loaders[kind] = loader
+
+async def load_page_source(key:str) -> menus.PageSource:
+    loader = page_source_loaders[key.partition(":")[0]]
+    source = await loader(key)
+    await source._prepare_once()
+    return source
+
+async def send_source_error(interaction:discord.Interaction, error:Exception) -> None:
+    """
+    Tells the user a page could not be shown, for interactions that were already deferred.
+    """
+    if isinstance(error, weatherbit.WeatherbitUnavailable):
+        message = f"{error}. Try again later."
+    elif isinstance(error, weatherbit.WeatherbitError):
+        message = str(error)
+    else:
+        message = "This menu has expired."
+    await interaction.followup.send(message, ephemeral=True)
+
+async def page_kwargs(source:menus.PageSource, key:str, page_number:int, user_id:int) -> dict[str, Any]:
+    """
+    Renders a page of a source into keyword arguments for `send` or `edit_message`.
+
+    The returned view holds no state of its own, everything needed to turn the page is
+    encoded in the custom ids of its buttons.
+    """
+    page = await source.get_page(page_number)
+    value = await discord.utils.maybe_coroutine(source.format_page, None, page)
+
+    if isinstance(value, dict):
+        kwargs = value
+    elif isinstance(value, str):
+        kwargs = {'content': value, 'embed': None}
+    else:
+        #No content key so page turns keep whatever text the menu was started with.
+        kwargs = {'embed': value}
+
+    view = discord.ui.View(timeout=None)
+    for action in PageButton.ACTIONS:
+        view.add_item(PageButton(action, page_number, user_id, key))
+    kwargs['view'] = view
+    return kwargs
+
+async def start_persistent_menu(ctx:commands.Context, key:str, source:menus.PageSource, *, content:str | None = None) -> discord.Message:
+    """
+    Sends the first page of a stateless menu.
+
+    Unlike `MyMenuPages` nothing is kept alive per message, so the buttons keep working
+    after the view would have timed out and across restarts as long as the loader for
+    the key can rebuild the source. `PageButton` must be registered with `bot.add_dynamic_items`.
+    """
+    await source._prepare_once()
+
+    #Custom ids are limited to 100 characters, fall back to a regular menu if the key does not fit.
+    if len(f"pg:first:{source.get_max_pages()}:{ctx.author.id}:{key}") > 100:
+        if content is not None:
+            await ctx.send(content)
+        menu = MyMenuPages(source)
+        await menu.start(ctx)
+        return menu.message
+
+    kwargs = await page_kwargs(source, key, 0, ctx.author.id)
+    if content is not None:
+        kwargs['content'] = content
+    return await ctx.send(**kwargs)
+
+class PageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"pg:(?P<action>\w+):(?P<page>\d+):(?P<user>\d+):(?P<key>.+)"):
+    ACTIONS = {
+        'first': '\U000023EA',
+        'prev': '\U00002B05',
+        'next': '\U000027A1',
+        'last': '\U000023ED',
+    }
+
+    def __init__(self, action:str, page:int, user_id:int, key:str) -> None:
+        custom_id = f"pg:{action}:{page}:{user_id}:{key}"
+        super().__init__(
+            discord.ui.Button(emoji=self.ACTIONS[action], style=discord.ButtonStyle.blurple, custom_id=custom_id)
+        )
+        self.action = action
+        self.page = page
+        self.user_id = user_id
+        self.key = key
+
+    @classmethod
+    async def from_custom_id(cls, interaction:discord.Interaction, item:discord.ui.Button, match:re.Match[str]) -> 'PageButton':
+        return cls(match['action'], int(match['page']), int(match['user']), match['key'])
+
+    async def interaction_check(self, interaction:discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def callback(self, interaction:discord.Interaction) -> None:
+        #Rebuilding the source can mean fetching from Weatherbit again (after a restart or once the
+        # cache expires), which can take longer than Discord waits for a response.
+        await interaction.response.defer()
+
+        try:
+            #A KeyError means there is no loader for the key any more.
+            source = await load_page_source(self.key)
+        except (weatherbit.WeatherbitError, KeyError) as e:
+            await send_source_error(interaction, e)
+            return
+
+        max_pages = source.get_max_pages()
+        match self.action:
+            case 'first':
+                page = 0
+            case 'prev':
+                page = self.page - 1
+            case 'next':
+                page = self.page + 1
+            case _:
+                page = max_pages - 1
+
+        #Same as show_checked_page, pressing past either end does nothing.
+        if page == self.page or not 0 <= page < max_pages:
+            return
+
+        await interaction.edit_original_response(**await page_kwargs(source, self.key, page, self.user_id))
@@ -0,0 +1,138 @@
+import discord
+import logging
+import os
+from discord.ext import commands
+from typing import Any, List
+import command_sync
+
+logger = logging.getLogger("bot")
+
+def create_bot(**options:Any) -> commands.Bot:
+    """
+    Builds the bot with its settings, listeners and owner commands, but no cogs.
+
+    Used by `bot.py` and the event replay harness so both run the same bot.
+
+    Parameters
+    ----------
+    options (Any): Overrides for the `commands.Bot` settings.
+
+    Returns
+    ----------
+    (commands.Bot): The bot, not started.
+    """
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    options.setdefault("command_prefix", '$')
+    options.setdefault("activity", discord.Game(name="$help"))
+    options.setdefault("intents", intents)
+    bot = commands.Bot(**options)
+
+    @bot.event
+    async def on_ready() -> None:
+        logger.info('We have logged in as {0.user}'.format(bot))
+
+    #Structured logs for every command, both prefix and slash invocations go through these for hybrid commands.
+    @bot.listen()
+    async def on_command(ctx:commands.Context) -> None:
+        logger.info(
+            "command invoked",
+            extra={
+                "command": ctx.command.qualified_name,
+                "user_id": ctx.author.id,
+                "guild_id": ctx.guild.id if ctx.guild else None,
+                "slash": ctx.interaction is not None,
+            }
+        )
+
+    @bot.listen()
+    async def on_command_error(ctx:commands.Context, error:commands.CommandError) -> None:
+        #Same as the default handler, leave errors to local handlers if there are any.
+        if ctx.command and ctx.command.has_error_handler():
+            return
+        if ctx.cog and ctx.cog.has_error_handler():
+            return
+
+        logger.error(
+            "command failed",
+            exc_info=(type(error), error, error.__traceback__),
+            extra={
+                "command": ctx.command.qualified_name if ctx.command else None,
+                "user_id": ctx.author.id,
+                "guild_id": ctx.guild.id if ctx.guild else None,
+            }
+        )
+
+    #Command to sync slash commands. Only syncs if the command definitions changed since the last sync.
+    # Use `$sync guild` to sync to the current guild only (updates instantly) and `force` to sync regardless.
+    @bot.command(hidden=True)
+    @commands.is_owner()
+    async def sync(ctx: commands.Context, *options:str) -> None:
+        guild = ctx.guild if "guild" in options else None
+        scope = str(guild.id) if guild else "global"
+
+        if guild:
+            ctx.bot.tree.copy_global_to(guild=guild)
+
+        hashes = command_sync.command_hashes(ctx.bot.tree, guild=guild)
+        added, removed, changed = command_sync.diff_hashes(command_sync.load_synced_hashes(scope), hashes)
+
+        if not (added or removed or changed) and "force" not in options:
+            await ctx.send(f"No changes to sync for {scope} commands")
+            return
+
+        synced = await ctx.bot.tree.sync(guild=guild)
+        command_sync.save_synced_hashes(scope, hashes)
+        logger.info(
+            "synced commands",
+            extra={"scope": scope, "added": added, "removed": removed, "changed": changed, "hash": command_sync.tree_hash(hashes)}
+        )
+
+        changes = [f"{label}: {', '.join(names)}" for label, names in (("Added", added), ("Removed", removed), ("Changed", changed)) if names]
+        await ctx.send(f"Synced {len(synced)} {scope} commands" + ("\n" + "\n".join(changes) if changes else ""))
+
+
+    #Loads a cog.
+    @bot.command(hidden=True)
+    @commands.is_owner()
+    async def load(ctx:commands.Context, extension) -> None:
+        try:
+            await bot.load_extension(f"cogs.{extension}")
+        except commands.ExtensionAlreadyLoaded:
+            await ctx.reply(f"{extension} cog is already loaded")
+        except commands.ExtensionNotFound:
+            await ctx.reply(f"{extension} cog not found")
+        else:
+            await ctx.reply(f"{extension} cog is loaded")
+
+    #Unloads a cog.
+    @bot.command(hidden=True)
+    @commands.is_owner()
+    async def unload(ctx:commands.Context, extension) -> None:
+        try:
+            await bot.unload_extension(f"cogs.{extension}")
+        except commands.ExtensionNotLoaded:
+            await ctx.reply(f"{extension} cog is already unloaded or not found")
+        else:
+            await ctx.reply(f"{extension} cog is unloaded")
+
+    #Reloads a cog.
+    @bot.command(hidden=True)
+    @commands.is_owner()
+    async def reload(ctx:commands.Context, extension) -> None:
+        try:
+            await bot.unload_extension(f"cogs.{extension}")
+        except commands.ExtensionNotLoaded: 
+            await ctx.reply(f"{extension} cog could not be reloaded")
+        else:
+            await bot.load_extension(f"cogs.{extension}")
+            await ctx.reply(f"{extension} cog has been reloaded")
+
+    return bot
+
+#Loads extensions from file, all of them unless a list of cog names is given.
+async def load_extensions(bot:commands.Bot, cogs:List[str] | None = None) -> None:
+    for filename in sorted(os.listdir("./cogs")):
+        if filename.endswith(".py") and (cogs is None or filename[:-3] in cogs):
+            await bot.load_extension(f"cogs.{filename[:-3]}")
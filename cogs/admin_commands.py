@@ -3,10 +3,14 @@ import re
 import asyncio
 from discord.ext import commands
 from collections import deque
-from typing import List, Any, Set, Iterable, Callable, TypeVar
+from discord import app_commands
+from typing import List, Any, Set, Iterable, Callable, TypeVar, Dict, Tuple
 
 T = TypeVar('T')
 
+#Autocomplete only fuzzy matches this many characters of input, which keeps it fast on guilds with lots of channels.
+FUZZY_MATCH_LENGTH = 20
+
 def levenshtein_distance(s:str,t:str) -> int:
     """
     Computes the Levenshtein distance between two strings
@@ -131,6 +135,88 @@ class AdminCommands(commands.Cog):
         #      variable shared by all.       
         self.cancel_timer = False
 
+        #Guild id -> voice channel id -> (name, stripped name). Built the first time a guild is used and
+        # then kept up to date by the channel listeners instead of being recomputed on every command.
+        self.voice_channel_index: Dict[int, Dict[int, Tuple[str, str]]] = {}
+
+    def strip_channel_name(self, name:str) -> str:
+        #Strip the channel name of any non-valid characters as well as convert to lowercase
+        return re.sub(self.ALPHANUMERIC_MATCH, "", name).lower()
+
+    def voice_channel_names(self, guild:discord.Guild) -> Dict[int, Tuple[str, str]]:
+        if guild.id not in self.voice_channel_index:
+            self.voice_channel_index[guild.id] = {
+                chan.id: (chan.name, self.strip_channel_name(chan.name)) for chan in guild.voice_channels
+            }
+        return self.voice_channel_index[guild.id]
+
+    def find_voice_channel(self, guild:discord.Guild, channel:str) -> discord.VoiceChannel | None:
+        """
+        Finds the voice channel with a given name, or the most likely one if there is no exact match.
+
+        Parameters
+        ----------
+        guild (discord.Guild): Guild to search in.
+        channel (str): Channel name given by the user.
+
+        Returns
+        ----------
+        (discord.VoiceChannel | None): The voice channel.
+        """
+        for _ in range(2):
+            names = self.voice_channel_names(guild)
+            channel_id = next((chan_id for chan_id, (name, _) in names.items() if name == channel), None)
+
+            #If the channel is not a valid channel then compute the Levenshtein distance between it and actual channels
+            if channel_id is None and names:
+                words = self.strip_channel_name(channel).split()
+
+                #Find the channel with minimum distance.
+                channel_id = min(
+                    names,
+                    key=lambda chan_id: sum(map(levenshtein_distance, words, names[chan_id][1].split()))
+                )
+
+            if channel_id is None:
+                return None
+            if (voice_channel := guild.get_channel(channel_id)) is not None:
+                return voice_channel
+
+            #The index has a channel which no longer exists, rebuild it and look again.
+            self.voice_channel_index.pop(guild.id, None)
+        return None
+
+    def index_voice_channel(self, channel:discord.abc.GuildChannel) -> None:
+        if isinstance(channel, discord.VoiceChannel) and channel.guild.id in self.voice_channel_index:
+            self.voice_channel_index[channel.guild.id][channel.id] = (channel.name, self.strip_channel_name(channel.name))
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel:discord.abc.GuildChannel) -> None:
+        self.index_voice_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before:discord.abc.GuildChannel, after:discord.abc.GuildChannel) -> None:
+        if before.name != after.name:
+            self.index_voice_channel(after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel:discord.abc.GuildChannel) -> None:
+        self.voice_channel_index.get(channel.guild.id, {}).pop(channel.id, None)
+
+    #Channels can change while the bot is disconnected without any channel events, so the index is
+    # rebuilt whenever discord.py rebuilds the guild, e.g. after reconnecting.
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild:discord.Guild) -> None:
+        self.voice_channel_index.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild:discord.Guild) -> None:
+        self.voice_channel_index.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild:discord.Guild) -> None:
+        self.voice_channel_index.pop(guild.id, None)
+
     async def countdown(self, t: int, message:discord.Message, content:str) -> None:
 
         while t > 0 and not self.cancel_timer:
@@ -191,30 +277,10 @@ class AdminCommands(commands.Cog):
     )
     @commands.has_guild_permissions(move_members=True) #Other permissions property assumes only text-channels
     async def move(self, ctx:commands.Context, users:commands.Greedy[discord.Member], *,channel:str)-> None:
-        voice_channels = ctx.guild.voice_channels
-        voice_channels_names = [chan.name for chan in voice_channels]
-        voice_channels_stripped = [re.sub(self.ALPHANUMERIC_MATCH, "",chan).lower() for chan in voice_channels_names]
-
-        #If the channel is not a valid channel then compute the Levenshtein distance between it and actual channels
-        if(channel not in voice_channels_names):
-            distances = []
-
-            #Strip the input channel name of any non-valid characters as well as convert to lowercase
-            channel_stripped = re.sub(self.ALPHANUMERIC_MATCH, "",channel).lower()
-            words = channel_stripped.split()
-
-            #Compute Levenshtein distance between input channel name and actual channel names
-            for voice_chan_name in voice_channels_stripped:
-                voice_chan_words = voice_chan_name.split()
-                distances.append(sum(list(map(levenshtein_distance,words,voice_chan_words))))
-            
-            #Find the element with minimum distance and set channel to corresponding one.
-            minimum_distance = min(distances)
-            channel = voice_channels[distances.index(minimum_distance)]
- 
-        else:
-            #Find discord.VoiceChannel object that matches channel name
-            channel = next((chan for chan in voice_channels if chan.name == channel),None)
+        channel = self.find_voice_channel(ctx.guild, channel)
+        if channel is None:
+            await ctx.reply("There are no voice channels to move to.")
+            return
 
         users = list(dict.fromkeys(users))
 
@@ -240,30 +306,10 @@ class AdminCommands(commands.Cog):
     )
     @commands.has_guild_permissions(move_members=True) #Other permissions property assumes only text-channels
     async def moveall(self, ctx:commands.Context, channel:str)-> None:
-        voice_channels = ctx.guild.voice_channels
-        voice_channels_names = [chan.name for chan in voice_channels]
-        voice_channels_stripped = [re.sub(self.ALPHANUMERIC_MATCH, "",chan).lower() for chan in voice_channels_names]
-
-        #If the channel is not a valid channel then compute the Levenshtein distance between it and actual channels
-        if(channel not in voice_channels_names):
-            distances = []
-
-            #Strip the input channel name of any non-valid characters as well as convert to lowercase
-            channel_stripped = re.sub(self.ALPHANUMERIC_MATCH, "",channel).lower()
-            words = channel_stripped.split()
-
-            #Compute Levenshtein distance between input channel name and actual channel names
-            for voice_chan_name in voice_channels_stripped:
-                voice_chan_words = voice_chan_name.split()
-                distances.append(sum(list(map(levenshtein_distance,words,voice_chan_words))))
-            
-            #Find the element with minimum distance and set channel to corresponding one.
-            minimum_distance = min(distances)
-            channel = voice_channels[distances.index(minimum_distance)]
- 
-        else:
-            #Find discord.VoiceChannel object that matches channel name
-            channel = next((chan for chan in voice_channels if chan.name == channel),None)
+        channel = self.find_voice_channel(ctx.guild, channel)
+        if channel is None:
+            await ctx.reply("There are no voice channels to move to.")
+            return
 
         author = ctx.message.author
         chan_author = author.voice.channel
@@ -275,6 +321,27 @@ class AdminCommands(commands.Cog):
 
         await ctx.reply(f"Moved {names} to {channel}")
 
+    @move.autocomplete("channel")
+    @moveall.autocomplete("channel")
+    async def channel_autocomplete(self, interaction:discord.Interaction, current:str) -> List[app_commands.Choice[str]]:
+        #Autocomplete runs before the permission checks, so it can be called from DMs.
+        if interaction.guild is None:
+            return []
+
+        names = list(self.voice_channel_names(interaction.guild).values())
+        current = self.strip_channel_name(current)
+
+        #Channels starting with the input come first, then the rest ordered by how close their start is to the input.
+        matches = [name for name, stripped in names if stripped.startswith(current)]
+
+        if len(matches) < 25:
+            others = [(name, stripped) for name, stripped in names if not stripped.startswith(current)]
+            current = current[:FUZZY_MATCH_LENGTH]
+            others.sort(key=lambda chan: levenshtein_distance(current, chan[1][:len(current)]))
+            matches.extend(name for name, _ in others)
+
+        return [app_commands.Choice(name=name, value=name) for name in matches[:25]]
+
     @commands.hybrid_command(
             description="Mutes all users except command sender for a certain amount of seconds.",
             help="Mutes all users except command sender for a certain amount of seconds."
@@ -1,31 +1,28 @@
 import discord
-import aiohttp
+import logging
 import json
 import csv
-import os
-from MyMenuPages import MyMenuPages
+import asyncio
+import weatherbit
+from gazetteer import Gazetteer
+from MyMenuPages import MyMenuPages, PageButton, register_page_source, start_persistent_menu
 from datetime import datetime
 from dotenv import load_dotenv 
 from discord.ext import commands
 from discord.ext import menus
+from discord import app_commands
+from typing import List, Optional
 
 
 load_dotenv()
 
-DEFAULT_CITY = 'Tokyo'
+logger = logging.getLogger(__name__)
 
-weather_parameters = {
-    "city" : DEFAULT_CITY,
-    "country":"",
-    "key" : os.getenv('WEATHER_API_KEY'),
-}
+DEFAULT_CITY = 'Tokyo'
 
-weeklyforecast_parameters = {
-    "city" : DEFAULT_CITY,
-    "country":"",
-    "key" : os.getenv('WEATHER_API_KEY'),
-    "days" : "8"
-}
+#Hourly forecast limits.
+MAX_FORECAST_HOURS = 120
+HOURS_PER_PAGE = 6
 
 #Only for testing purposes
 def jprint(obj):
@@ -56,6 +53,37 @@ def country_from_code(iso_code:str) -> str:
             iso_country_codes[line['Alpha-2 code']] = line['English short name lower case']
     return iso_country_codes[iso_code]
 
+def parse_city(city:str) -> tuple[str, str]:
+    """
+    Splits a city argument of the form [city_name, country_code] into its parts.
+
+    Parameters
+    ----------
+    city (str): City argument, the country code is optional.
+
+    Returns
+    ----------
+    (tuple[str, str]): The city name and the country code (empty if not given).
+    """
+    name, _, country = city.partition(",")
+    return name.strip(), country.strip()
+
+def stale_note(response_data:dict) -> str | None:
+    """
+    Describes how old the data is if it was served from the cache while Weatherbit is unavailable.
+
+    Parameters
+    ----------
+    response_data (dict): Response data returned by the `weatherbit` module.
+
+    Returns
+    ----------
+    (str | None): The note, or `None` if the data is up to date.
+    """
+    if "stale_seconds" not in response_data:
+        return None
+    return f"Weatherbit is unavailable, showing data from {round(response_data['stale_seconds'] / 60)} minutes ago."
+
 def find_2nd(string:str, substring:str) -> int:
     """
     Finds the second occurence of a substring in a string
@@ -145,12 +173,102 @@ class ForecastSource(menus.ListPageSource):
             embed.add_field(name = "Wind Direction", value = f"{wind_dir}", inline = True)
         
             #Trying to make this multiline messes up the spacing for some reason.
-            embed.set_footer(text = "Max and Min are measured from 12-12. High and Low are measured from 7am-7pm and 7pm-7am respectively. Also note that weather forecasts are never fully accurate.")
+            embed.set_footer(text = (entries['stale'] + " " if entries.get('stale') else "") + "Max and Min are measured from 12-12. High and Low are measured from 7am-7pm and 7pm-7am respectively. Also note that weather forecasts are never fully accurate.")
             return embed 
 
+class HourlyForecastSource(menus.PageSource):
+    """
+    Page source for the hourly forecast which only builds the embeds of the pages that are shown.
+
+    Weatherbit's hourly endpoint has no offset, every request starts from the current hour, so
+    the whole window is fetched in one (cached) request when the menu starts.
+    """
+    def __init__(self, city:str, country_code:str, hours:int) -> None:
+        self.city = city
+        self.country_code = country_code
+        self.country = ""
+        self.hours = hours
+        self.entries = []
+        self.stale = None
+
+    def is_paginating(self) -> bool:
+        return self.hours > HOURS_PER_PAGE
+
+    def get_max_pages(self) -> int:
+        pages, left_over = divmod(self.hours, HOURS_PER_PAGE)
+        return pages + 1 if left_over else pages
+
+    async def prepare(self) -> None:
+        response_data = await weatherbit.hourly_forecast(self.city, self.country_code, self.hours)
+
+        #A cached response can cover more hours than asked for, and Weatherbit can return fewer.
+        self.entries = response_data["data"][:self.hours]
+        self.hours = len(self.entries)
+
+        #Also get city name result in case user misspelled it
+        self.city = response_data['city_name']
+        self.country = country_from_code(response_data['country_code'])
+        self.stale = stale_note(response_data)
+
+    async def get_page(self, page_number:int) -> list:
+        start = page_number * HOURS_PER_PAGE
+        return self.entries[start:start + HOURS_PER_PAGE]
+
+    async def format_page(self, menu, entries) -> discord.Embed:
+        embed = discord.Embed(
+            title = "Hourly Forecast",
+            description = f"The hourly forecast in {self.city}, {self.country}",
+            color = discord.Colour.random()
+        )
+        embed.set_author(name = "HomieBot")
+        embed.set_thumbnail(url = 'https://www.weatherbit.io/static/img/icons/' + entries[0]['weather']['icon'] + ".png")
+
+        for hour in entries:
+            hour_time = datetime.fromisoformat(hour['timestamp_local']).strftime("%a %I%p").replace(" 0", " ")
+            embed.add_field(
+                name = hour_time,
+                value = (
+                    f"{hour['temp']}°C (feels like {hour['app_temp']}°C), {hour['weather']['description']}\n"
+                    f"Precipitation: {hour['pop']}% chance, {round(hour['precip'],2)}mm/hr\n"
+                    f"Wind: {round(hour['wind_spd'],2)}m/s {hour['wind_cdir']}, Humidity: {round(hour['rh'],2)}%"
+                ),
+                inline = False
+            )
+
+        embed.set_footer(text = (self.stale + " " if self.stale else "") + "Times are local to the city. Also note that weather forecasts are never fully accurate.")
+        return embed
+
 class Weather(commands.Cog):
-    def __init__(self, bot) -> None:
+    def __init__(self, bot, gazetteer:Gazetteer) -> None:
         self.bot = bot
+        self.gazetteer = gazetteer
+
+    async def cog_command_error(self, ctx:commands.Context, error:commands.CommandError) -> None:
+        #Slash invocations of hybrid commands wrap the app command error in another error.
+        original = error
+        if isinstance(original, commands.HybridCommandError):
+            original = original.original
+        if isinstance(original, (commands.CommandInvokeError, app_commands.CommandInvokeError)):
+            original = original.original
+
+        if isinstance(original, weatherbit.WeatherbitUnavailable):
+            await ctx.send(f"{original}. Try again later.")
+        elif isinstance(original, weatherbit.WeatherbitError):
+            await ctx.send(str(original))
+        elif isinstance(original, (commands.UserInputError, app_commands.TransformerError)):
+            await ctx.send(str(original))
+        elif isinstance(original, (commands.CheckFailure, app_commands.CheckFailure)):
+            #e.g. someone other than the owner using weatherstatus, nothing went wrong so nothing is logged.
+            return
+        else:
+            logger.error("command failed", exc_info=(type(error), error, error.__traceback__), extra={"command": ctx.command.qualified_name})
+            await ctx.send("Something went wrong getting the weather, try again later.")
+
+    def resolve_city(self, city:str) -> tuple[str, str]:
+        """
+        Parses a city argument and resolves it to a canonical city and country code using the gazetteer.
+        """
+        return self.gazetteer.resolve(*parse_city(city))
     
     #Current Weather Command
     @commands.hybrid_command(
@@ -161,61 +279,53 @@ class Weather(commands.Cog):
         await ctx.defer()
 
         #Argument can be in form of City,Country Code (last is optional but will
-        # default to some random option)
-        if "," in city:
-            weather_parameters["city"] = city.partition(",")[0]
-            weather_parameters["country"] = city.partition(",")[2].strip()
-        else:
-            weather_parameters["city"] = city
-            weather_parameters["country"] = ""
+        # default to the most populated match). Names are matched against the gazetteer.
+        city, country_code = self.resolve_city(city)
 
         #Can be slow at times but I guess at least it's non-blocking
-        async with aiohttp.ClientSession() as cs:
-            async with cs.get("https://api.weatherbit.io/v2.0/current", params = weather_parameters) as r:
-                response_data = await r.json()
-                 
-                weather_data = response_data["data"][0]
+        response_data = await weatherbit.current_weather(city, country_code)
+        weather_data = response_data["data"][0]
         
-                #Convert country code from result back to country name
-                #Also get city name result in case user misspelled it
-                country_code = weather_data['country_code']
-                country = country_from_code(country_code)
-                city = weather_data['city_name']
-
-                feel_temp = weather_data['app_temp']
-                temp = weather_data['temp']
-
-                humidity = weather_data['rh']
-
-                wind_dir = weather_data['wind_cdir']
-                wind_spd = weather_data['wind_spd']
-
-                precip = weather_data['precip']
-                snow = weather_data['snow']
-
-                weather_descrip = weather_data['weather']['description']
-                weather_icon = weather_data['weather']['icon']
-                icon_url = 'https://www.weatherbit.io/static/img/icons/' + weather_icon + ".png"
-
-                embed = discord.Embed(
-                    title = "Current Weather",
-                    description = f"The current weather in {city}, {country}",
-                    color = discord.Color.blue()
-                )
-
-                embed.set_author(name = "HomieBot")
-                embed.set_thumbnail(url = icon_url)
-                embed.add_field(name = "Temperature", value = f"{temp}°C", inline = True)
-                embed.add_field(name = "Feels Like", value = f"{feel_temp}°C", inline = True)
-                embed.add_field(name = "Description", value = weather_descrip, inline = False)
-                embed.add_field(name = "Precipitation", value = f"{precip}mm/hr", inline = False)
-                embed.add_field(name = "Snowfall", value = f"{snow}mm/hr", inline = False)
-                embed.add_field(name = "Relative Humidity", value = f"{round(humidity,2)}%", inline = False)
-                embed.add_field(name = "Wind Speed", value = f"{round(wind_spd,2)}m/s", inline = True)
-                embed.add_field(name = "Wind Direction", value = f"{wind_dir}", inline = True)
+        #Convert country code from result back to country name
+        #Also get city name result in case user misspelled it
+        country_code = weather_data['country_code']
+        country = country_from_code(country_code)
+        city = weather_data['city_name']
+
+        feel_temp = weather_data['app_temp']
+        temp = weather_data['temp']
+
+        humidity = weather_data['rh']
+
+        wind_dir = weather_data['wind_cdir']
+        wind_spd = weather_data['wind_spd']
+
+        precip = weather_data['precip']
+        snow = weather_data['snow']
+
+        weather_descrip = weather_data['weather']['description']
+        weather_icon = weather_data['weather']['icon']
+        icon_url = 'https://www.weatherbit.io/static/img/icons/' + weather_icon + ".png"
+
+        embed = discord.Embed(
+            title = "Current Weather",
+            description = f"The current weather in {city}, {country}",
+            color = discord.Color.blue()
+        )
+
+        embed.set_author(name = "HomieBot")
+        embed.set_thumbnail(url = icon_url)
+        embed.add_field(name = "Temperature", value = f"{temp}°C", inline = True)
+        embed.add_field(name = "Feels Like", value = f"{feel_temp}°C", inline = True)
+        embed.add_field(name = "Description", value = weather_descrip, inline = False)
+        embed.add_field(name = "Precipitation", value = f"{precip}mm/hr", inline = False)
+        embed.add_field(name = "Snowfall", value = f"{snow}mm/hr", inline = False)
+        embed.add_field(name = "Relative Humidity", value = f"{round(humidity,2)}%", inline = False)
+        embed.add_field(name = "Wind Speed", value = f"{round(wind_spd,2)}m/s", inline = True)
+        embed.add_field(name = "Wind Direction", value = f"{wind_dir}", inline = True)
         
-                embed.set_footer(text = "Note results may be inaccurate")
-                await ctx.send(embed=embed)
+        embed.set_footer(text = " ".join(filter(None, [stale_note(response_data), "Note results may be inaccurate"])))
+        await ctx.send(embed=embed)
 
     #7-Day Forecast Command
     @commands.hybrid_command(
@@ -224,41 +334,97 @@ class Weather(commands.Cog):
     )
     async def weeklyforecast(self, ctx:commands.Context, *, city:str = DEFAULT_CITY) -> None:
         await ctx.defer()
-        
+
         #Argument can be in form of City,Country Code (last is optional but will
-        # default to some random option)
-        if "," in city:
-            weeklyforecast_parameters["city"] = city.partition(",")[0]
-            weeklyforecast_parameters["country"] = city.partition(",")[2].strip()
-        else:
-            weeklyforecast_parameters["city"] = city
-            weeklyforecast_parameters["country"] = ""
-            
-        #Can be slow at times but I guess at least it's non-blocking
-        async with aiohttp.ClientSession() as cs:
-            async with cs.get("https://api.weatherbit.io/v2.0/forecast/daily", params = weeklyforecast_parameters) as r:
-                response_data = await r.json()
-  
-                forecast_data = response_data["data"]
+        # default to the most populated match). Names are matched against the gazetteer.
+        city, country_code = self.resolve_city(city)
+        key = weatherbit.cache_key("daily", city, country_code)
+        formatter = await daily_forecast_source(key)
+
+        forecast = formatter.entries[0]
+        await start_persistent_menu(
+            ctx, key, formatter,
+            content = f"Here is the weekly forecast for {forecast['city']}, {forecast['country']}"
+        )
+
+    #Hourly Forecast Command
+    @commands.hybrid_command(
+            description="Gives the hourly forecast for a city. Format for city is [city_name, country]",
+            help=f"Gives the hourly forecast for a city for up to {MAX_FORECAST_HOURS} hours. Format for city is [city_name, country]"
+    )
+    async def hourlyforecast(self, ctx:commands.Context, hours:Optional[int] = 48, *, city:str = DEFAULT_CITY) -> None:
+        await ctx.defer()
+
+        hours = max(1, min(hours, MAX_FORECAST_HOURS))
+        city, country_code = self.resolve_city(city)
+
+        formatter = HourlyForecastSource(city, country_code, hours)
+        menu = MyMenuPages(formatter)
+        await menu.start(ctx)
+
+    #Shows the state of the Weatherbit circuit breaker.
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def weatherstatus(self, ctx:commands.Context) -> None:
+        breaker = weatherbit.breaker
+        p50 = breaker.latency_percentile(50)
+        p95 = breaker.latency_percentile(95)
+
+        embed = discord.Embed(title = "Weatherbit Status", color = discord.Color.blue())
+        embed.add_field(name = "Circuit", value = breaker.state.title(), inline = True)
+        embed.add_field(name = "Consecutive Failures", value = str(breaker.failures), inline = True)
+        if breaker.state != breaker.CLOSED:
+            embed.add_field(name = "Retrying In", value = f"{round(breaker.retry_in())}s", inline = True)
+        embed.add_field(
+            name = "Latency (p50/p95)",
+            value = f"{round(p50 * 1000)}/{round(p95 * 1000)}ms" if p50 is not None else "Not enough requests yet",
+            inline = False
+        )
+        embed.add_field(name = "Hedged Requests", value = f"{breaker.hedged} ({'on' if weatherbit.HEDGE_REQUESTS else 'off'})", inline = True)
+        embed.add_field(name = "Cached Responses", value = str(len(weatherbit.response_cache)), inline = True)
+        await ctx.send(embed=embed)
+
+    @weather.autocomplete("city")
+    @weeklyforecast.autocomplete("city")
+    @hourlyforecast.autocomplete("city")
+    async def city_autocomplete(self, interaction:discord.Interaction, current:str) -> List[app_commands.Choice[str]]:
+        choices = []
+        for city in self.gazetteer.complete(current):
+            choice = f"{city.name}, {city.country_code}"
+            choices.append(app_commands.Choice(name=choice, value=choice))
+        return choices
+
+async def daily_forecast_source(key:str) -> ForecastSource:
+    """
+    Builds the page source for a daily forecast key, used directly and by the pagination buttons.
+    """
+    _, city, country_code = weatherbit.split_cache_key(key)
+    response_data = await weatherbit.daily_forecast(city, country_code)
+
+    forecast_data = response_data["data"]
+
+    #Convert country code from result back to country name
+    #Also get city name result in case user misspelled it
+    country = country_from_code(response_data['country_code'])
+    city = response_data['city_name']
+
+    #Unless there's an easier way, the city and country must be placed in each forecast dict to be used
+    # in the embed.
+    for data in forecast_data:
+        data.update({"city":city})
+        data.update({"country":country})
+        data.update({"stale":stale_note(response_data)})
+
+    return ForecastSource(forecast_data, per_page=1)
 
-                #Convert country code from result back to country name
-                #Also get city name result in case user misspelled it
-                country_code = response_data['country_code']
-                country = country_from_code(country_code)
-                city = response_data['city_name']
-        
-                #Unless there's an easier way, the city and country must be placed in each forecast dict to be used
-                # in the embed.
-                for data in forecast_data:
-                    data.update({"city":city})
-                    data.update({"country":country})
-
-                formatter = ForecastSource(forecast_data, per_page=1)
-                menu = MyMenuPages(formatter)
-
-                #Unless pagination code is rewritten we must directly reply like this to avoid the "The application did not respond".
-                await ctx.send(f"Here is the weekly forecast for {city}, {country}") 
-                await menu.start(ctx)
-           
 async def setup(bot) -> None:
-    await bot.add_cog(Weather(bot))
+    #Pagination buttons are handled by one dynamic item for every menu instead of a view per message.
+    register_page_source("daily", daily_forecast_source)
+    bot.add_dynamic_items(PageButton)
+
+    #Reading the city list takes a while, keep it off the event loop so loading the cog doesn't stall the bot.
+    gazetteer = await asyncio.to_thread(Gazetteer.from_csv)
+    await bot.add_cog(Weather(bot, gazetteer))
+
+async def teardown(bot) -> None:
+    bot.remove_dynamic_items(PageButton)
@@ -0,0 +1,84 @@
+import discord
+import hashlib
+import json
+import os
+from discord import app_commands
+from typing import Dict, List, Tuple
+
+#Where the hashes of the last synced command definitions are kept, per scope ("global" or a guild id).
+SYNC_STATE_FILE = "synced_commands.json"
+
+def command_hashes(tree:app_commands.CommandTree, guild:discord.abc.Snowflake | None = None) -> Dict[str, str]:
+    """
+    Hashes the definition of every application command in a scope of the command tree.
+
+    The hash is taken over the same payload that is sent to Discord when syncing, with keys
+    sorted so it only changes when the command definition does.
+
+    Parameters
+    ----------
+    tree (app_commands.CommandTree): The bot's command tree.
+    guild (discord.abc.Snowflake | None): Guild to hash the commands of, `None` for global commands.
+
+    Returns
+    ----------
+    (Dict[str, str]): Command names mapped to the SHA-256 of their definition.
+    """
+    hashes = {}
+    for command in tree.get_commands(guild=guild):
+        payload = command.to_dict(tree)
+        name = payload["name"]
+
+        #Context menus can share a name with a slash command.
+        if payload.get("type", 1) != 1:
+            name = f"{name} ({discord.AppCommandType(payload['type']).name} menu)"
+
+        hashes[name] = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return hashes
+
+def tree_hash(hashes:Dict[str, str]) -> str:
+    """
+    Combines per-command hashes into one hash for the whole scope.
+    """
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+
+def diff_hashes(old:Dict[str, str], new:Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Compares two sets of command hashes.
+
+    Returns
+    ----------
+    (Tuple[List[str], List[str], List[str]]): The added, removed and changed command names.
+    """
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    changed = sorted(name for name in new.keys() & old.keys() if new[name] != old[name])
+    return added, removed, changed
+
+def load_synced_hashes(scope:str, path:str | None = None) -> Dict[str, str]:
+    """
+    Loads the command hashes from the last sync of a scope, empty if it was never synced.
+
+    The state is kept in `SYNC_STATE_FILE` unless another path is given. It is looked up on
+    every call so the event replay harness can point it somewhere else.
+    """
+    path = path or SYNC_STATE_FILE
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f).get(scope, {})
+
+def save_synced_hashes(scope:str, hashes:Dict[str, str], path:str | None = None) -> None:
+    path = path or SYNC_STATE_FILE
+    state = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+
+    state[scope] = hashes
+
+    #Write to a temporary file first so a crash mid-write can't lose the state of other scopes.
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
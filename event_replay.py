@@ -0,0 +1,445 @@
+"""
+Gateway event replay harness for throughput testing.
+
+Records (or synthesizes) gateway event streams to a JSON-lines file and replays them into
+the bot's dispatcher with the Discord and Weatherbit APIs mocked out, then reports event loop lag, handler
+latency percentiles and how far the handlers fall behind.
+
+Usage:
+    python event_replay.py record events.jsonl [--duration SECONDS]
+    python event_replay.py synthesize events.jsonl [--duration 10] [--voice-rate 200] [--message-rate 50] ...
+    python event_replay.py replay events.jsonl [--speed 1] [--http-latency 50] [--cogs admin_commands weather]
+
+Each line of an event file is `{"ts": seconds since start, "t": event name, "d": event data}`,
+the same `t` and `d` the gateway sends in a dispatch payload.
+"""
+import argparse
+import asyncio
+import discord
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from discord.ext import commands
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Tuple
+import command_sync
+import weatherbit
+from bot_factory import create_bot, load_extensions
+from log_config import setup_logging
+
+load_dotenv()
+
+#Snowflakes used by synthesized events. Only need to be unique within a file.
+_snowflakes = itertools.count(100000000000000000)
+
+#How often the event loop lag monitor wakes up, in seconds.
+LAG_INTERVAL = 0.01
+
+def make_bot() -> commands.Bot:
+    #Same bot as bot.py, except member chunking which needs a gateway connection.
+    return create_bot(chunk_guilds_at_startup = False)
+
+def percentiles(samples:List[float]) -> Dict[str, float]:
+    """
+    Summarizes samples in milliseconds.
+
+    Parameters
+    ----------
+    samples (List[float]): Durations in seconds.
+
+    Returns
+    ----------
+    (Dict[str, float]): The p50, p95, p99 and max of the samples in milliseconds.
+    """
+    if not samples:
+        return {}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 2),
+        "p95": round(cuts[94] * 1000, 2),
+        "p99": round(cuts[98] * 1000, 2),
+        "max": round(max(samples) * 1000, 2),
+    }
+
+def load_events(path:str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_events(path:str, events:List[Dict[str, Any]]) -> None:
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+def timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+async def record(path:str, duration:float) -> None:
+    """
+    Connects to Discord with the bot token and writes every dispatch event received for `duration` seconds.
+    """
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    client = discord.Client(intents = intents, enable_debug_events = True)
+
+    start = None
+    events = []
+
+    @client.event
+    async def on_socket_raw_receive(msg:str) -> None:
+        nonlocal start
+        payload = json.loads(msg)
+        if payload.get("op") != 0:
+            return
+        if start is None:
+            start = time.monotonic()
+        events.append({"ts": round(time.monotonic() - start, 6), "t": payload["t"], "d": payload["d"]})
+
+    async with client:
+        await client.login(os.getenv('DISCORD_TOKEN'))
+        try:
+            await asyncio.wait_for(client.connect(), timeout = duration)
+        except asyncio.TimeoutError:
+            pass
+
+    save_events(path, events)
+    print(f"Recorded {len(events)} events to {path}")
+
+def user_payload(user_id:int, name:str, bot:bool = False) -> Dict[str, Any]:
+    return {"id": str(user_id), "username": name, "discriminator": "0", "global_name": name, "avatar": None, "bot": bot}
+
+def member_payload(user:Dict[str, Any]) -> Dict[str, Any]:
+    return {"user": user, "roles": [], "joined_at": timestamp(), "deaf": False, "mute": False, "nick": None, "flags": 0}
+
+def message_payload(message_id:int, channel_id:int, guild_id:int | None, author:Dict[str, Any], content:str) -> Dict[str, Any]:
+    payload = {
+        "id": str(message_id), "channel_id": str(channel_id), "author": author, "content": content,
+        "timestamp": timestamp(), "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0,
+    }
+    if guild_id is not None:
+        payload["guild_id"] = str(guild_id)
+        payload["member"] = member_payload(author)
+    return payload
+
+def synthesize(duration:float, members:int, voice_channels:int, voice_rate:float, message_rate:float, commands_:List[str]) -> List[Dict[str, Any]]:
+    """
+    Builds an event stream for one guild: a GUILD_CREATE followed by voice state updates
+    (members joining, switching and leaving voice channels) and command messages, each
+    as a Poisson process with the given rate per second.
+    """
+    guild_id = next(_snowflakes)
+    text_channel_id = next(_snowflakes)
+    voice_channel_ids = [next(_snowflakes) for _ in range(voice_channels)]
+    users = [user_payload(next(_snowflakes), f"member{i}") for i in range(members)]
+    owner = users[0]
+    bot_user = user_payload(next(_snowflakes), "HomieBot", bot = True)
+
+    channels = [{"id": str(text_channel_id), "type": 0, "name": "general", "position": 0, "permission_overwrites": []}]
+    channels += [
+        {"id": str(chan_id), "type": 2, "name": f"voice {i}", "position": i + 1, "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}
+        for i, chan_id in enumerate(voice_channel_ids)
+    ]
+
+    guild = {
+        "id": str(guild_id), "name": "replay", "owner_id": owner["id"], "member_count": members + 1,
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": str(discord.Permissions.all().value), "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": channels, "members": [member_payload(user) for user in users + [bot_user]],
+        "emojis": [], "stickers": [], "features": [], "threads": [], "presences": [], "large": members > 250,
+    }
+
+    def voice_state(user:Dict[str, Any], channel_id:int | None) -> Dict[str, Any]:
+        return {
+            "guild_id": str(guild_id), "channel_id": str(channel_id) if channel_id else None, "user_id": user["id"],
+            "member": member_payload(user), "session_id": "replay", "deaf": False, "mute": False,
+            "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+        }
+
+    #The owner sends every command and stays in the first voice channel so voice commands have someone to act on.
+    guild["voice_states"] = [voice_state(owner, voice_channel_ids[0])]
+    events = [{"ts": 0.0, "t": "GUILD_CREATE", "d": guild}]
+
+    def voice_event(ts:float) -> Dict[str, Any]:
+        user = random.choice(users[1:] or users)
+        return {"ts": ts, "t": "VOICE_STATE_UPDATE", "d": voice_state(user, random.choice(voice_channel_ids + [None]))}
+
+    def message_event(ts:float) -> Dict[str, Any]:
+        content = "$" + random.choice(commands_)
+        return {"ts": ts, "t": "MESSAGE_CREATE", "d": message_payload(next(_snowflakes), text_channel_id, guild_id, owner, content)}
+
+    for rate, make in ((voice_rate, voice_event), (message_rate, message_event)):
+        if rate <= 0:
+            continue
+        ts = random.expovariate(rate)
+        while ts < duration:
+            events.append(make(round(ts, 6)))
+            ts += random.expovariate(rate)
+
+    events.sort(key=lambda event: event["ts"])
+    return events
+
+class FakeHTTP:
+    """
+    Stands in for `HTTPClient.request`, answering every route after a fixed latency.
+
+    Message routes get a message payload back so commands can edit and reply to what they
+    sent, member edits and command syncs get a matching payload, every other route gets an empty answer.
+    """
+    def __init__(self, bot_user:Dict[str, Any], latency:float) -> None:
+        self.bot_user = bot_user
+        self.latency = latency
+        self.requests = defaultdict(int)
+
+    async def request(self, route:discord.http.Route, **kwargs:Any) -> Any:
+        self.requests[f"{route.method} {route.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        #Routes only keep a few of their parameters, the last id is taken from the url instead.
+        last_id = route.url.rsplit("/", 1)[-1]
+
+        if route.path == "/channels/{channel_id}/messages" and route.method == "POST":
+            payload = kwargs.get("json") or {}
+            return message_payload(next(_snowflakes), route.channel_id, None, self.bot_user, payload.get("content") or "")
+        if route.path == "/channels/{channel_id}/messages/{message_id}" and route.method == "PATCH":
+            payload = kwargs.get("json") or {}
+            return message_payload(int(last_id), route.channel_id, None, self.bot_user, payload.get("content") or "")
+        if route.path == "/channels/{channel_id}/messages" and route.method == "GET":
+            return []
+        if route.path == "/guilds/{guild_id}/members/{user_id}" and route.method == "PATCH":
+            return member_payload(user_payload(int(last_id), f"member {last_id}"))
+        if route.path.endswith("/commands") and route.method == "PUT":
+            #Syncing gets the commands back with the ids Discord gives them.
+            return [{**command, "id": str(next(_snowflakes)), "application_id": self.bot_user["id"]} for command in kwargs.get("json") or []]
+        return None
+
+def weather_payload(hour:int = 0) -> Dict[str, Any]:
+    return {
+        "temp": 20.0, "app_temp": 19.5, "max_temp": 24.0, "min_temp": 15.0, "high_temp": 23.5, "low_temp": 16.0,
+        "rh": 60, "wind_cdir": "NW", "wind_spd": 3.2, "precip": 0.0, "pop": 10, "snow": 0.0, "uv": 4.0,
+        "weather": {"description": "Few clouds", "icon": "c02d"},
+        "valid_date": (datetime(2024, 1, 1) + timedelta(days = hour // 24)).strftime("%Y-%m-%d"),
+        "timestamp_local": (datetime(2024, 1, 1) + timedelta(hours = hour)).isoformat(),
+    }
+
+class FakeWeatherbit:
+    """
+    Stands in for `weatherbit._get`, answering every endpoint with made up weather after a fixed latency.
+    """
+    def __init__(self, latency:float) -> None:
+        self.latency = latency
+        self.requests = defaultdict(int)
+
+    async def get(self, url:str, params:dict) -> Tuple[int, Any]:
+        endpoint = url.removeprefix(weatherbit.WEATHERBIT_URL)
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        city = {"city_name": params.get("city") or "Tokyo", "country_code": params.get("country") or "JP"}
+        match endpoint:
+            case "current":
+                return 200, {"data": [{**weather_payload(), **city}]}
+            case "forecast/daily":
+                return 200, {**city, "data": [weather_payload(day * 24) for day in range(7)]}
+            case "forecast/hourly":
+                return 200, {**city, "data": [weather_payload(hour) for hour in range(int(params.get("hours", 48)))]}
+        return 204, None
+
+class Replay:
+    """
+    Feeds events into a bot's gateway parsers and measures how the bot keeps up.
+
+    Handler latency is measured per dispatched event from when the handler was scheduled to
+    when it finished, which includes time spent queued behind other work on the event loop.
+    """
+    #Events which need a gateway connection to parse and are skipped.
+    SKIPPED_EVENTS = {"READY", "RESUMED"}
+
+    def __init__(self, bot:commands.Bot, speed:float) -> None:
+        self.bot = bot
+        self.speed = speed
+        self.handler_latency = defaultdict(list)
+        self.loop_lag = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.backlog = []
+        self.feed_lag = []
+        self._stopping = False
+
+        #Wrap the event scheduler so every listener task is timed.
+        schedule_event = bot._schedule_event
+
+        def timed_schedule_event(coro, event_name:str, *args:Any, **kwargs:Any) -> asyncio.Task:
+            scheduled = time.perf_counter()
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            async def timed(*args:Any, **kwargs:Any) -> None:
+                try:
+                    await coro(*args, **kwargs)
+                finally:
+                    self.in_flight -= 1
+                    self.handler_latency[event_name].append(time.perf_counter() - scheduled)
+
+            return schedule_event(timed, event_name, *args, **kwargs)
+
+        bot._schedule_event = timed_schedule_event
+
+    async def monitor(self) -> None:
+        #Sleeps should wake up on time, anything later is time the loop was busy with something else.
+        while not self._stopping:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag.append(max(0, time.perf_counter() - start - LAG_INTERVAL))
+            self.backlog.append(self.in_flight)
+
+    async def feed(self, events:List[Dict[str, Any]]) -> int:
+        parsers = self.bot._connection.parsers
+        start = time.perf_counter()
+        fed = 0
+
+        for event in events:
+            if self.speed > 0:
+                due = event["ts"] / self.speed
+                delay = due - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.feed_lag.append(-delay)
+            else:
+                #Still yield to the loop so handlers get to run between events.
+                await asyncio.sleep(0)
+
+            parser = parsers.get(event["t"])
+            if parser is not None and event["t"] not in self.SKIPPED_EVENTS:
+                parser(event["d"])
+                fed += 1
+        return fed
+
+    async def run(self, events:List[Dict[str, Any]], drain_timeout:float) -> Dict[str, Any]:
+        monitor = asyncio.create_task(self.monitor())
+        start = time.perf_counter()
+        fed = await self.feed(events)
+        feed_time = time.perf_counter() - start
+
+        #Wait for handlers still running, e.g. talkingstick turns which last many seconds.
+        drain_start = time.perf_counter()
+        while self.in_flight and time.perf_counter() - drain_start < drain_timeout:
+            await asyncio.sleep(LAG_INTERVAL)
+
+        self._stopping = True
+        await monitor
+        total_time = time.perf_counter() - start
+
+        return {
+            "events": fed,
+            "feed_seconds": round(feed_time, 3),
+            "total_seconds": round(total_time, 3),
+            "events_per_second": round(fed / feed_time, 1) if feed_time else None,
+            "feed_lag_ms": percentiles(self.feed_lag),
+            "loop_lag_ms": percentiles(self.loop_lag),
+            "handler_latency_ms": {name: {"count": len(samples), **percentiles(samples)} for name, samples in sorted(self.handler_latency.items())},
+            "backlog": {
+                "max": self.max_in_flight,
+                "at_end_of_feed": self.backlog[int(len(self.backlog) * feed_time / total_time) - 1] if self.backlog else 0,
+                "unfinished": self.in_flight,
+            },
+        }
+
+async def replay(path:str, speed:float, http_latency:float, cogs:List[str] | None, drain_timeout:float) -> Dict[str, Any]:
+    events = load_events(path)
+
+    #Anything the bot writes goes to a temporary directory, so replayed `$sync`s don't make the real bot
+    # think its commands are synced and the real logs are left alone.
+    state_dir = tempfile.mkdtemp(prefix = "homiebot-replay-")
+    command_sync.SYNC_STATE_FILE = os.path.join(state_dir, "synced_commands.json")
+    os.environ["LOG_FILE"] = os.path.join(state_dir, "homiebot.log")
+
+    #Log like the bot does, the cost of logging every command is part of what is being measured.
+    setup_logging()
+
+    fake_weatherbit = FakeWeatherbit(http_latency)
+    weatherbit._get = fake_weatherbit.get
+
+    bot = make_bot()
+
+    #Recorded streams have the bot user in READY, synthesized ones have it as a member of the guild.
+    ready = next((event["d"] for event in events if event["t"] == "READY"), None)
+    guild_event = next((event for event in events if event["t"] == "GUILD_CREATE"), None)
+    if ready:
+        bot_user = ready["user"]
+    elif guild_event and any(member["user"].get("bot") for member in guild_event["d"]["members"]):
+        bot_user = next(member["user"] for member in guild_event["d"]["members"] if member["user"].get("bot"))
+    else:
+        bot_user = user_payload(next(_snowflakes), "HomieBot", bot = True)
+    fake_http = FakeHTTP(bot_user, http_latency)
+    bot.http.request = fake_http.request
+
+    async with bot:
+        bot._connection.user = discord.ClientUser(state = bot._connection, data = bot_user)
+        #A bot's application id is the id of its user, needed by `$sync`.
+        bot._connection.application_id = int(bot_user["id"])
+
+        #Synthesized guilds are owned by the message author so owner-only commands work too.
+        if guild_event:
+            bot.owner_id = int(guild_event["d"]["owner_id"])
+
+        await load_extensions(bot, cogs)
+
+        report = await Replay(bot, speed).run(events, drain_timeout)
+
+    report["http_requests"] = dict(fake_http.requests)
+    report["weatherbit_requests"] = dict(fake_weatherbit.requests)
+    report["state_dir"] = state_dir
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Record, synthesize and replay gateway events to measure bot throughput.")
+    subparsers = parser.add_subparsers(dest = "mode", required = True)
+
+    record_parser = subparsers.add_parser("record", help = "Record live gateway events using DISCORD_TOKEN.")
+    record_parser.add_argument("file")
+    record_parser.add_argument("--duration", type = float, default = 60, help = "Seconds to record for.")
+
+    synth_parser = subparsers.add_parser("synthesize", help = "Generate a synthetic event stream.")
+    synth_parser.add_argument("file")
+    synth_parser.add_argument("--duration", type = float, default = 10, help = "Length of the stream in seconds.")
+    synth_parser.add_argument("--members", type = int, default = 100)
+    synth_parser.add_argument("--voice-channels", type = int, default = 10)
+    synth_parser.add_argument("--voice-rate", type = float, default = 200, help = "Voice state updates per second.")
+    synth_parser.add_argument("--message-rate", type = float, default = 50, help = "Command messages per second.")
+    synth_parser.add_argument("--commands", nargs = "+", default = ["ping", "help"], help = "Commands to send, without the prefix.")
+    synth_parser.add_argument("--seed", type = int, default = None)
+
+    replay_parser = subparsers.add_parser("replay", help = "Replay an event file into the bot and report how it kept up.")
+    replay_parser.add_argument("file")
+    replay_parser.add_argument("--speed", type = float, default = 1, help = "Playback speed multiplier, 0 replays as fast as possible.")
+    replay_parser.add_argument("--http-latency", type = float, default = 50, help = "Simulated Discord and Weatherbit API latency in milliseconds.")
+    replay_parser.add_argument("--cogs", nargs = "+", default = None, help = "Cogs to load, all of them by default.")
+    replay_parser.add_argument("--drain-timeout", type = float, default = 30, help = "Seconds to wait for handlers after the last event.")
+
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        asyncio.run(record(args.file, args.duration))
+    elif args.mode == "synthesize":
+        random.seed(args.seed)
+        events = synthesize(args.duration, args.members, args.voice_channels, args.voice_rate, args.message_rate, args.commands)
+        save_events(args.file, events)
+        print(f"Wrote {len(events)} events to {args.file}")
+    else:
+        report = asyncio.run(replay(args.file, args.speed, args.http_latency / 1000, args.cogs, args.drain_timeout))
+        print(json.dumps(report, indent = 4))
+
+if __name__ == "__main__":
+    main()
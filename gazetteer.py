@@ -0,0 +1,121 @@
+import bisect
+import csv
+import heapq
+import unicodedata
+from typing import List, NamedTuple, Tuple
+
+#City data from GeoNames (https://www.geonames.org/, CC BY 4.0), cities with a population over 15000.
+CITIES_FILE = "cities.csv"
+
+#Discord only shows up to 25 autocomplete choices.
+MAX_CHOICES = 25
+
+class City(NamedTuple):
+    name: str
+    country_code: str
+    population: int
+
+def normalize(name:str) -> str:
+    """
+    Normalizes a city name for lookups.
+
+    Accents are stripped, case is folded and everything other than letters, digits and
+    single spaces is removed, so `São Paulo` and `sao-paulo` compare equal.
+
+    Parameters
+    ----------
+    name (str): A city name.
+
+    Returns
+    ----------
+    (str): The normalized name.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+class Gazetteer:
+    """
+    Offline city index used to autocomplete and pre-resolve city arguments.
+
+    Cities are kept in a list sorted by normalized name, so every city starting with a
+    prefix is a contiguous slice found with two binary searches.
+    """
+    def __init__(self, cities:List[City]) -> None:
+        pairs = sorted((normalize(city.name), city) for city in cities)
+        self._keys = [key for key, _ in pairs]
+        self._cities = [city for _, city in pairs]
+
+    @classmethod
+    def from_csv(cls, path:str = CITIES_FILE) -> 'Gazetteer':
+        with open(path, encoding="utf-8") as f:
+            cities = [City(line['name'], line['country_code'], int(line['population'])) for line in csv.DictReader(f)]
+        return cls(cities)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def _prefix_range(self, prefix:str) -> Tuple[int, int]:
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + "\U0010FFFF", lo=start)
+        return start, end
+
+    def complete(self, text:str, limit:int = MAX_CHOICES) -> List[City]:
+        """
+        Finds the most populated cities starting with some text.
+
+        The text can be in the form [city_name, country_code] to only get cities in one country.
+
+        Parameters
+        ----------
+        text (str): What the user has typed so far.
+        limit (int): Maximum number of cities returned.
+
+        Returns
+        ----------
+        (List[City]): Matching cities, most populated first.
+        """
+        name, _, country_code = text.partition(",")
+        prefix = normalize(name)
+        country_code = country_code.strip().upper()
+
+        if not prefix:
+            return []
+
+        start, end = self._prefix_range(prefix)
+        matches = (city for city in self._cities[start:end] if city.country_code.startswith(country_code))
+        return heapq.nlargest(limit, matches, key=lambda city: city.population)
+
+    def resolve(self, name:str, country_code:str = "") -> Tuple[str, str]:
+        """
+        Turns user input into a canonical city name and country code.
+
+        Only exact (normalized) matches are resolved, the most populated city wins when several
+        match. Misspellings are not corrected as a close match is often a different real place
+        (e.g. `Saint Johns` and `Saint John`), anything without a match is returned unchanged so
+        Weatherbit can still have a go at it. Autocomplete is what keeps users from misspelling.
+
+        Parameters
+        ----------
+        name (str): City name as typed by the user.
+        country_code (str): Optional ISO 3166-1 alpha-2 country code.
+
+        Returns
+        ----------
+        (Tuple[str, str]): The city name and country code.
+        """
+        key = normalize(name)
+        country_code = country_code.strip().upper()
+
+        if not key:
+            return name, country_code
+
+        start, end = self._prefix_range(key)
+        exact = [self._cities[i] for i in range(start, end) if self._keys[i] == key]
+        candidates = [city for city in exact if not country_code or city.country_code == country_code]
+
+        if not candidates:
+            return name, country_code
+
+        city = max(candidates, key=lambda city: city.population)
+        return city.name, city.country_code
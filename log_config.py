@@ -0,0 +1,171 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#Attributes every LogRecord has, anything else on a record was passed through `extra` and is logged as a field.
+RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "[{asctime}] [{levelname:<8}] {name}: {message}"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+
+    Fields passed with `extra` are added to the object, e.g.
+    `logger.info("api call", extra={"endpoint": "current", "duration_ms": 120})`.
+    """
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which keeps exceptions separate from the message.
+
+    The default `prepare` merges the traceback into the message, which would put it in
+    the JSON `message` field instead of `exception`.
+    """
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Rotates the log file at a time interval or once it gets bigger than `max_bytes`, whichever comes first.
+    """
+    def __init__(self, filename:str, max_bytes:int = 0, **kwargs) -> None:
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record:logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    def rotation_filename(self, default_name:str) -> str:
+        #Size based rollovers can happen more than once in the same interval, so backups are named with the
+        # time of the rollover down to the second plus a zero padded counter, which sorts oldest first.
+        #The counter carries on from the highest one used this second, not the first free one, as
+        # older backups of the same second may already have been deleted.
+        name = f"{self.baseFilename}.{time.strftime('%Y-%m-%d_%H-%M-%S')}"
+        directory, prefix = os.path.split(name + ".")
+        counters = [int(file[len(prefix):]) for file in os.listdir(directory) if file.startswith(prefix) and file[len(prefix):].isdigit()]
+        count = max(counters, default=-1) + 1
+        return super().rotation_filename(f"{name}.{count:03d}")
+
+    def getFilesToDelete(self) -> list[str]:
+        directory, base_name = os.path.split(self.baseFilename)
+        prefix = base_name + "."
+        backups = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(prefix))
+
+        if len(backups) <= self.backupCount:
+            return []
+        return backups[:len(backups) - self.backupCount]
+
+def parse_levels(levels:str) -> dict[str, str]:
+    """
+    Parses per-logger levels in the form `logger=LEVEL,other.logger=LEVEL`.
+
+    Parameters
+    ----------
+    levels (str): Comma separated logger levels.
+
+    Returns
+    ----------
+    (dict[str, str]): Logger names mapped to level names.
+    """
+    parsed = {}
+    for item in levels.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Sets up JSON-lines file logging and console logging behind a queue.
+
+    Loggers only put records on a queue, a background thread owned by the returned listener
+    does the formatting and file I/O so logging never blocks the event loop. Configured with
+    the following `.env` variables:
+
+    - `LOG_FILE`: Path of the JSON-lines log file. Default `logs/homiebot.log`.
+    - `LOG_MAX_BYTES`: Rotate once the file is this big, 0 to disable. Default 5 MB.
+    - `LOG_ROTATE_WHEN`: Time based rotation interval, as in `TimedRotatingFileHandler`. Default `midnight`.
+    - `LOG_BACKUP_COUNT`: Number of rotated files to keep. Default 7.
+    - `LOG_LEVEL`: Root logger level. Default `INFO`.
+    - `LOG_LEVELS`: Per-logger levels, e.g. `discord=WARNING,weatherbit=DEBUG`.
+
+    Returns
+    ----------
+    (logging.handlers.QueueListener): The started listener, it is also stopped at exit.
+    """
+    log_file = os.getenv("LOG_FILE", "logs/homiebot.log")
+    if os.path.dirname(log_file):
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    file_handler = SizedTimedRotatingFileHandler(
+        log_file,
+        max_bytes = int(os.getenv("LOG_MAX_BYTES", 5 * 1024 * 1024)),
+        when = os.getenv("LOG_ROTATE_WHEN", "midnight"),
+        backupCount = int(os.getenv("LOG_BACKUP_COUNT", 7)),
+        encoding = "utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT, style="{"))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(PreparedQueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def elapsed_ms(start:float) -> float:
+    """
+    Milliseconds since a `time.perf_counter()` reading, rounded for logging.
+    """
+    return round((time.perf_counter() - start) * 1000, 2)
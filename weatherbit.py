@@ -0,0 +1,394 @@
+import aiohttp
+import asyncio
+import logging
+import os
+import statistics
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+from log_config import elapsed_ms
+from typing import Any, Dict, Tuple
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEATHERBIT_URL = "https://api.weatherbit.io/v2.0/"
+
+#Forecasts only update a few times an hour so there is no point asking for them more often than this.
+CACHE_TTL = 600
+
+#Expired responses are kept this long to be served when Weatherbit is down.
+MAX_STALE_AGE = 24 * 60 * 60
+
+#Least recently used responses are dropped once the cache holds this many.
+MAX_CACHE_ENTRIES = 256
+
+#Give up on a request after this many seconds instead of aiohttp's default of 5 minutes.
+REQUEST_TIMEOUT = 10
+
+#Circuit breaker settings. Calls slower than BREAKER_SLOW_CALL seconds count as failures.
+BREAKER_FAILURES = 5
+BREAKER_SLOW_CALL = 5
+BREAKER_RESET_TIMEOUT = 30
+
+#Hedged requests send a second attempt when the first is slower than the p95 latency. This can use
+# up to twice the API quota for slow calls, so it is off unless enabled in .env.
+HEDGE_REQUESTS = os.getenv("WEATHERBIT_HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+HEDGE_MIN_SAMPLES = 20
+
+class WeatherbitError(Exception):
+    """
+    Weatherbit could not give a usable answer for a request, e.g. the city does not exist.
+    """
+
+class WeatherbitUnavailable(WeatherbitError):
+    """
+    Weatherbit is down, too slow or rate limiting, so stale data can be served instead.
+    """
+
+class CircuitOpenError(WeatherbitUnavailable):
+    """
+    The request was not sent because the circuit breaker is open.
+    """
+
+class ResponseCache:
+    """
+    Small time-based cache for Weatherbit responses keyed by strings.
+
+    Entries older than `ttl` seconds are treated as missing by `get` but are kept for up
+    to `max_stale_age` seconds so `get_stale` can still return them while Weatherbit is down.
+    At most `max_entries` are kept, the least recently used ones are dropped first.
+    """
+    def __init__(self, ttl:float = CACHE_TTL, max_stale_age:float = MAX_STALE_AGE, max_entries:int = MAX_CACHE_ENTRIES) -> None:
+        self.ttl = ttl
+        self.max_stale_age = max_stale_age
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key:str) -> Any | None:
+        entry = self.get_stale(key)
+        if entry is None or entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def get_stale(self, key:str) -> Tuple[float, Any] | None:
+        """
+        Gets an entry even if it has expired.
+
+        Returns
+        ----------
+        (Tuple[float, Any] | None): The age of the entry in seconds and its value.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        age = time.monotonic() - stored_at
+        if age > self.max_stale_age:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return age, value
+
+    def set(self, key:str, value:Any) -> None:
+        now = time.monotonic()
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+
+        #Drop anything too old to be served, then the least recently used entries if still over the limit.
+        for old_key in [old_key for old_key, (stored_at, _) in self._entries.items() if now - stored_at > self.max_stale_age]:
+            del self._entries[old_key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key:str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CircuitBreaker:
+    """
+    Stops sending requests to Weatherbit after repeated failures.
+
+    The breaker opens after `failure_threshold` consecutive failed or slow calls. While open
+    requests fail straight away, then after `reset_timeout` seconds one trial request is let
+    through (half open). If it succeeds the breaker closes again, otherwise it stays open for
+    another `reset_timeout`.
+
+    Latencies of recent calls are also kept here to decide when to hedge requests.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half open"
+
+    def __init__(self, failure_threshold:int = BREAKER_FAILURES, slow_call:float = BREAKER_SLOW_CALL, reset_timeout:float = BREAKER_RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.latencies = deque(maxlen=100)
+        self.hedged = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+
+        #Let one trial request through per reset_timeout, so a trial that never reports back can't block forever.
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self, latency:float) -> None:
+        self.latencies.append(latency)
+        if latency > self.slow_call:
+            self.record_failure()
+            return
+
+        if self.state != self.CLOSED:
+            logger.info("weatherbit circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            logger.warning("weatherbit circuit opened", extra={"failures": self.failures})
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """
+        Seconds until a trial request will be let through, 0 if the breaker is closed.
+        """
+        if self.state == self.CLOSED:
+            return 0
+        return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def latency_percentile(self, percentile:int) -> float | None:
+        """
+        A percentile of recent call latencies in seconds, `None` if there are too few samples.
+        """
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(self.latencies, n=100)[percentile - 1]
+
+response_cache = ResponseCache()
+breaker = CircuitBreaker()
+
+def cache_key(kind:str, city:str, country:str = "") -> str:
+    """
+    Builds the cache key for a request.
+
+    The key is also used as pagination state in button custom ids, so it has to be
+    enough to redo the request after a restart. The city goes last as it is the only
+    part which can contain arbitrary characters.
+
+    Parameters
+    ----------
+    kind (str): Type of request, e.g. `daily`.
+    city (str): City name.
+    country (str): Optional ISO 3166-1 alpha-2 country code.
+
+    Returns
+    ----------
+    (str): The cache key.
+    """
+    return f"{kind}:{country.strip().upper()}:{city.strip()}"
+
+def split_cache_key(key:str) -> Tuple[str, str, str]:
+    """
+    Inverse of `cache_key`.
+
+    Returns
+    ----------
+    (Tuple[str, str, str]): The kind, city and country of the key.
+    """
+    kind, _, rest = key.partition(":")
+    country, _, city = rest.partition(":")
+    return kind, city, country
+
+async def _get(url:str, params:dict) -> Tuple[int, Any]:
+    async with aiohttp.ClientSession(timeout = aiohttp.ClientTimeout(total = REQUEST_TIMEOUT)) as cs:
+        async with cs.get(url, params = params) as r:
+            #Weatherbit answers 204 with no body when it can't find the city, and error pages from
+            # proxies in front of it are often HTML, so only the status matters for those.
+            if r.status == 204 or r.status >= 500 or r.status == 429:
+                return r.status, None
+            return r.status, await r.json(content_type = None)
+
+async def _hedged_get(url:str, params:dict) -> Tuple[int, Any]:
+    """
+    Sends a request, and a second one if the first takes longer than the p95 latency.
+
+    The first successful response wins and the other request is cancelled.
+    """
+    delay = breaker.latency_percentile(95) if HEDGE_REQUESTS else None
+    first = asyncio.create_task(_get(url, params))
+    if delay is None:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout = delay)
+    if done:
+        return first.result()
+
+    breaker.hedged += 1
+    logger.debug("hedging weatherbit request", extra={"delay_ms": round(delay * 1000, 2)})
+    pending = {first, asyncio.create_task(_get(url, params))}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        #Both attempts failed, raise the error of the last one.
+        return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def fetch(endpoint:str, **params:Any) -> dict:
+    """
+    Sends a GET request to a Weatherbit endpoint and returns the decoded JSON.
+
+    Requests go through the circuit breaker, and are hedged if enabled.
+
+    Parameters
+    ----------
+    endpoint (str): Path of the endpoint relative to `WEATHERBIT_URL`, e.g. `forecast/daily`.
+    params (Any): Query parameters, the API key is added automatically.
+
+    Returns
+    ----------
+    (dict): The response data.
+
+    Raises
+    ----------
+    WeatherbitUnavailable: Weatherbit failed, timed out or the circuit breaker is open.
+    WeatherbitError: Weatherbit returned no data, e.g. because the city was not found.
+    """
+    #Log the parameters before the key is added so it never ends up in the logs.
+    log_fields = {"endpoint": endpoint, "params": dict(params)}
+    params["key"] = os.getenv('WEATHER_API_KEY')
+
+    if not breaker.allow():
+        raise CircuitOpenError(f"Weatherbit is unavailable, retrying in {round(breaker.retry_in())}s")
+
+    start = time.perf_counter()
+    try:
+        status, response_data = await _hedged_get(WEATHERBIT_URL + endpoint, params)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        #ValueError is a body that isn't valid JSON, which only happens when something in front of Weatherbit is failing.
+        breaker.record_failure()
+        logger.exception("weatherbit request failed", extra={**log_fields, "duration_ms": elapsed_ms(start)})
+        raise WeatherbitUnavailable("Weatherbit is not responding") from e
+
+    logger.info("weatherbit request", extra={**log_fields, "status": status, "duration_ms": elapsed_ms(start)})
+
+    #Server errors and rate limiting mean Weatherbit is struggling, anything else is a problem with the request.
+    if status >= 500 or status == 429:
+        breaker.record_failure()
+        raise WeatherbitUnavailable(f"Weatherbit returned status {status}")
+
+    breaker.record_success(time.perf_counter() - start)
+
+    if not response_data or "data" not in response_data or not response_data["data"]:
+        error = response_data.get("error") if isinstance(response_data, dict) else None
+        raise WeatherbitError(error or f"No weather data found for {params.get('city')}")
+    return response_data
+
+async def cached_fetch(key:str, endpoint:str, **params:Any) -> dict:
+    """
+    Same as `fetch` but uses the response cache, and falls back to expired data if Weatherbit is unavailable.
+
+    Stale responses are returned as a copy with a `stale_seconds` field giving their age.
+    """
+    response_data = response_cache.get(key)
+    if response_data is not None:
+        return response_data
+
+    try:
+        response_data = await fetch(endpoint, **params)
+    except WeatherbitUnavailable:
+        stale = response_cache.get_stale(key)
+        if stale is None:
+            raise
+        age, response_data = stale
+        logger.warning("serving stale weatherbit data", extra={"key": key, "age_s": round(age)})
+        return {**response_data, "stale_seconds": round(age)}
+
+    response_cache.set(key, response_data)
+    return response_data
+
+async def current_weather(city:str, country:str = "") -> dict:
+    """
+    Gets the current weather for a city, using the response cache when possible.
+
+    Parameters
+    ----------
+    city (str): City name.
+    country (str): Optional ISO 3166-1 alpha-2 country code.
+
+    Returns
+    ----------
+    (dict): The response data.
+    """
+    return await cached_fetch(cache_key("current", city, country), "current", city = city, country = country)
+
+async def daily_forecast(city:str, country:str = "") -> dict:
+    """
+    Gets the daily forecast for a city, using the response cache when possible.
+
+    Parameters
+    ----------
+    city (str): City name.
+    country (str): Optional ISO 3166-1 alpha-2 country code.
+
+    Returns
+    ----------
+    (dict): The response data.
+    """
+    return await cached_fetch(cache_key("daily", city, country), "forecast/daily", city = city, country = country, days = "8")
+
+async def hourly_forecast(city:str, country:str = "", hours:int = 24) -> dict:
+    """
+    Gets at least `hours` hours of the hourly forecast for a city, using the response cache when possible.
+
+    Weatherbit has no offset for the hourly endpoint so a longer window is fetched from the
+    start, a cached response covering at least as many hours is reused instead.
+
+    Parameters
+    ----------
+    city (str): City name.
+    country (str): Optional ISO 3166-1 alpha-2 country code.
+    hours (int): Number of hours wanted, Weatherbit allows up to 120.
+
+    Returns
+    ----------
+    (dict): The response data.
+    """
+    key = cache_key("hourly", city, country)
+    cached = response_cache.get(key)
+
+    if cached is not None and cached[0] >= hours:
+        return cached[1]
+
+    try:
+        response_data = await fetch("forecast/hourly", city = city, country = country, hours = str(hours))
+    except WeatherbitUnavailable:
+        stale = response_cache.get_stale(key)
+        if stale is None:
+            raise
+        age, (_, response_data) = stale
+        logger.warning("serving stale weatherbit data", extra={"key": key, "age_s": round(age)})
+        return {**response_data, "stale_seconds": round(age)}
+
+    response_cache.set(key, (hours, response_data))
+    return response_data